@@ -1,9 +1,16 @@
 from flask import Flask, request, render_template, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from flask_compress import Compress
+import click
+from PIL import Image, ImageOps
+from sqlalchemy import or_
+from sqlalchemy.orm import declared_attr
 from datetime import datetime, timedelta
 import random
 import os
+import time
+import hashlib
 import requests
 import json
 
@@ -16,6 +23,12 @@ CORS(app,
      allow_headers=["Content-Type", "Authorization"],
      supports_credentials=False)
 
+# Response compression for HTML and JSON (static images are already compressed)
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'application/json']
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_REGISTER'] = False  # Applied from add_cache_headers, before the ETag check
+compress = Compress(app)
+
 # Database configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///orders.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -30,6 +43,24 @@ SHIPROCKET_CONFIG = {
     'tokenExpiry': datetime(2025, 8, 21)
 }
 
+# Order archival configuration
+ARCHIVE_CONFIG = {
+    'minAgeDays': int(os.environ.get('ORDER_ARCHIVE_MIN_AGE_DAYS', 90)),
+    'batchSize': int(os.environ.get('ORDER_ARCHIVE_BATCH_SIZE', 200)),
+    'batchPause': float(os.environ.get('ORDER_ARCHIVE_BATCH_PAUSE', 0.1)),  # Seconds between batches
+    'terminalStatuses': ['Delivered', 'Cancelled'],
+    'terminalDeliveryStatuses': ['Delivered', 'Returned']
+}
+
+# Static asset configuration
+STATIC_CONFIG = {
+    'maxAge': 31536000,  # One year, only for content-hashed URLs
+    'thumbnailFolder': 'thumbs',
+    'thumbnailSize': (160, 160),
+    'thumbnailSources': ['uploads', 'images'],
+    'thumbnailExtensions': ('.jpg', '.jpeg', '.png')
+}
+
 # ------------------- MODELS -------------------
 
 class User(db.Model):
@@ -47,10 +78,18 @@ class Product(db.Model):
     in_stock = db.Column(db.Boolean, default=True)
     stock_number = db.Column(db.Integer)
 
-class Order(db.Model):
+class OrderFields:
+    """Columns shared by live orders and their archived copies"""
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+
+    @declared_attr
+    def user_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    @declared_attr
+    def product_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+
     quantity = db.Column(db.Integer, default=1)
     status = db.Column(db.String(50), default='Pending')
     price_paid = db.Column(db.Float, default=0.0)
@@ -86,9 +125,22 @@ class Order(db.Model):
     shiprocket_status = db.Column(db.String(100), nullable=True)
     shiprocket_tracking_url = db.Column(db.String(500), nullable=True)
 
+class Order(OrderFields, db.Model):
+    # AUTOINCREMENT stops SQLite from reusing ids of archived orders. create_all()
+    # only applies this to new databases; existing ones need the order table
+    # rebuilt (create the new table, copy rows, swap) to pick it up.
+    __table_args__ = {'sqlite_autoincrement': True}
+
     user = db.relationship('User', backref=db.backref('orders', lazy=True))
     product = db.relationship('Product', backref=db.backref('orders', lazy=True))
 
+class ArchivedOrder(OrderFields, db.Model):
+    """Terminal orders moved out of the live Order table by archive_orders()"""
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('archived_orders', lazy=True))
+    product = db.relationship('Product', backref=db.backref('archived_orders', lazy=True))
+
 # ------------------- SHIPROCKET INTEGRATION -------------------
 
 def get_shiprocket_token():
@@ -276,6 +328,183 @@ def create_shiprocket_order(order_data):
         print(error_message)
         return None, error_message
 
+# ------------------- ORDER ARCHIVAL -------------------
+
+def archive_orders(min_age_days=None, batch_size=None, max_batches=None, batch_pause=0):
+    """Move old Delivered/Returned/Cancelled orders into the archive table"""
+    if min_age_days is None:
+        min_age_days = ARCHIVE_CONFIG['minAgeDays']
+    if batch_size is None:
+        batch_size = ARCHIVE_CONFIG['batchSize']
+
+    cutoff = datetime.utcnow() - timedelta(days=min_age_days)
+    # Never archive the newest row: on databases created before the order table
+    # used AUTOINCREMENT, SQLite reuses the highest freed rowid. This only holds
+    # while nothing else deletes the highest-id order.
+    newest_id = db.session.query(db.func.max(Order.id)).scalar()
+    if newest_id is None:
+        return 0
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = (Order.query
+                 .filter(Order.order_date < cutoff, Order.id < newest_id)
+                 .filter(or_(Order.status.in_(ARCHIVE_CONFIG['terminalStatuses']),
+                             Order.delivery_status.in_(ARCHIVE_CONFIG['terminalDeliveryStatuses'])))
+                 .order_by(Order.id)
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+
+        try:
+            # One short transaction per batch so the write lock is released in between
+            for order in batch:
+                fields = {column.name: getattr(order, column.name) for column in Order.__table__.columns}
+                db.session.add(ArchivedOrder(**fields))
+                db.session.delete(order)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error archiving orders after {archived} archived: {e}")
+            raise
+
+        archived += len(batch)
+        batches += 1
+        print(f"Archived {archived} orders so far")
+        if batch_pause:
+            time.sleep(batch_pause)
+
+    return archived
+
+def is_terminal_order(order):
+    """True when an order is in a state that archive_orders() would move"""
+    return (order.status in ARCHIVE_CONFIG['terminalStatuses']
+            or order.delivery_status in ARCHIVE_CONFIG['terminalDeliveryStatuses'])
+
+def restore_if_active(order):
+    """Move an edited archived order back to the live table if it is no longer terminal"""
+    if not isinstance(order, ArchivedOrder) or is_terminal_order(order):
+        return order
+
+    fields = {column.name: getattr(order, column.name) for column in Order.__table__.columns}
+    live_order = Order(**fields)
+    db.session.add(live_order)
+    db.session.delete(order)
+    return live_order
+
+def get_order_or_404(order_id):
+    """Look up an order in the live table, falling back to the archive"""
+    # Ids are unique across both tables as long as the order table uses
+    # AUTOINCREMENT (see Order); otherwise a reused id hides the archived row.
+    order = db.session.get(Order, order_id)
+    if order is None:
+        order = ArchivedOrder.query.get_or_404(order_id)
+    return order
+
+# ------------------- STATIC ASSETS -------------------
+
+_static_hashes = {}
+
+def static_file_hash(filename):
+    """Short content hash of a static file, cached until its mtime changes"""
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cached = _static_hashes.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'rb') as f:
+        digest = hashlib.md5(f.read()).hexdigest()[:12]
+    _static_hashes[filename] = (mtime, digest)
+    return digest
+
+def generate_thumbnails():
+    """Pre-generate resized copies of uploaded images for list views"""
+    generated = 0
+    for folder in STATIC_CONFIG['thumbnailSources']:
+        source_dir = os.path.join(app.static_folder, folder)
+        if not os.path.isdir(source_dir):
+            continue
+
+        for name in os.listdir(source_dir):
+            if not name.lower().endswith(STATIC_CONFIG['thumbnailExtensions']):
+                continue
+
+            source = os.path.join(source_dir, name)
+            target = os.path.join(app.static_folder, STATIC_CONFIG['thumbnailFolder'], folder, name)
+            if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                continue
+
+            # Write to a temp file and swap it in, so readers never see a partial thumbnail
+            root, extension = os.path.splitext(target)
+            temp_target = f"{root}.{os.getpid()}.tmp{extension}"
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with Image.open(source) as image:
+                    image = ImageOps.exif_transpose(image)
+                    image.thumbnail(STATIC_CONFIG['thumbnailSize'])
+                    if image.mode not in ('RGB', 'L') and not name.lower().endswith('.png'):
+                        image = image.convert('RGB')
+                    image.save(temp_target, optimize=True, quality=85)
+                os.replace(temp_target, target)
+                generated += 1
+            except Exception as e:
+                print(f"Error generating thumbnail for {folder}/{name}: {e}")
+                if os.path.exists(temp_target):
+                    os.remove(temp_target)
+
+    return generated
+
+@app.template_global()
+def thumbnail_url(filename):
+    """URL of the pre-generated thumbnail, or the original if there is none"""
+    thumbnail = f"{STATIC_CONFIG['thumbnailFolder']}/{filename}"
+    if os.path.exists(os.path.join(app.static_folder, thumbnail)):
+        return url_for('static', filename=thumbnail)
+    return url_for('static', filename=filename)
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    """Append a content hash to static URLs so they can be cached long-term"""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = static_file_hash(values['filename'])
+        if version:
+            values['v'] = version
+
+@app.after_request
+def add_cache_headers(response):
+    """Long-lived caching for hashed static URLs, weak ETags for pages and APIs"""
+    if request.endpoint == 'static':
+        # Only the current hash is immutable; stale or bogus versions keep the default no-cache
+        version = request.args.get('v')
+        if version and version == static_file_hash(request.view_args['filename']):
+            response.headers['Cache-Control'] = f"public, max-age={STATIC_CONFIG['maxAge']}, immutable"
+        return response
+
+    conditional = (request.method == 'GET' and response.status_code == 200
+                   and response.mimetype in ('text/html', 'application/json')
+                   and not response.direct_passthrough)
+    if conditional:
+        response.add_etag(weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+
+        # Flask-Compress suffixes the ETag with the encoding (W/"abc:br"), so match
+        # every variant here and answer 304 before paying for compression
+        etag, _ = response.get_etag()
+        for suffix in [''] + [f":{algorithm}" for algorithm in app.config['COMPRESS_ALGORITHM']]:
+            if request.if_none_match.contains_weak(etag + suffix):
+                response.set_etag(etag + suffix, weak=True)
+                response.vary.add('Accept-Encoding')
+                return response.make_conditional(request)
+
+    return compress.after_request(response)
+
 # ------------------- DATABASE INITIALIZATION -------------------
 
 def init_database():
@@ -551,14 +780,15 @@ def view_orders():
 @app.route("/order/<int:order_id>/update", methods=["POST"])
 def update_order_status(order_id):
     new_status = request.form.get("status")
-    order = Order.query.get_or_404(order_id)
+    order = get_order_or_404(order_id)
     order.status = new_status
+    restore_if_active(order)
     db.session.commit()
     return redirect(url_for('view_orders'))
 
 @app.route("/order/<int:order_id>/edit", methods=["GET", "POST"])
 def edit_order(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = get_order_or_404(order_id)
     if request.method == "POST":
         # Basic order information
         order.quantity = int(request.form.get("quantity", 1))
@@ -591,6 +821,7 @@ def edit_order(order_id):
         order.payment_id = request.form.get("payment_id", "")
         
         try:
+            restore_if_active(order)
             db.session.commit()
             return redirect(url_for("view_orders"))
         except Exception as e:
@@ -605,7 +836,7 @@ def edit_order(order_id):
 def sync_shiprocket_order(order_id):
     """Manual sync of Shiprocket order status"""
     try:
-        order = Order.query.get_or_404(order_id)
+        order = get_order_or_404(order_id)
         
         if not order.shiprocket_order_id:
             return {"error": "No Shiprocket order ID found"}, 400
@@ -640,6 +871,7 @@ def sync_shiprocket_order(order_id):
                 elif 'dispatched' in shiprocket_status:
                     order.delivery_status = 'In Transit'
                     
+                restore_if_active(order)
                 db.session.commit()
                 
             return {"success": True, "data": shiprocket_data}, 200
@@ -649,6 +881,29 @@ def sync_shiprocket_order(order_id):
     except Exception as e:
         return {"error": f"Sync failed: {str(e)}"}, 500
 
+@app.route("/archive/run", methods=["POST"])
+def run_archive():
+    """Manually archive one batch of old terminal orders; full runs use the CLI"""
+    try:
+        archived = archive_orders(max_batches=1)
+        return {"success": True, "archived": archived}, 200
+    except Exception as e:
+        return {"error": f"Archival failed: {str(e)}"}, 500
+
+@app.cli.command("archive-orders")
+@click.option("--min-age-days", type=click.IntRange(min=1), default=None,
+              help="Override ORDER_ARCHIVE_MIN_AGE_DAYS for this run")
+def archive_orders_command(min_age_days):
+    """Archive old terminal orders (for use from cron)"""
+    archived = archive_orders(min_age_days=min_age_days, batch_pause=ARCHIVE_CONFIG['batchPause'])
+    print(f"Archived {archived} orders")
+
+@app.cli.command("generate-thumbnails")
+def generate_thumbnails_command():
+    """Generate thumbnails for images under static/uploads and static/images"""
+    generated = generate_thumbnails()
+    print(f"Generated {generated} thumbnails")
+
 @app.route("/init")
 def generate_data():
     """Manual endpoint to reinitialize data if needed"""